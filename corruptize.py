@@ -2,26 +2,70 @@
 
 import numpy as np
 import tempfile
+from noisereduce import reduce_noise
+from pedalboard import Pedalboard, Delay, Reverb, Phaser
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional, fall back to the numpy path
+    njit = None
 
 SAMPLE_RATE = 44100
+# samples per internal pedalboard block (pedalboard's default is 8192);
+# larger blocks mean fewer per-block round trips for a frame-sized buffer
+BUFFER_SIZE = 1 << 16
 _GLOBAL_BOARD = None
+_SCRATCH = {}
+
+def _scratch_buffer(shape, dtype=np.float32):
+    # persistent work buffer per frame shape and dtype, reused across frames
+    key = (shape, np.dtype(dtype))
+    buf = _SCRATCH.get(key)
+    if buf is None:
+        buf = _SCRATCH[key] = np.empty(shape, dtype=dtype)
+    return buf
+
+if njit is not None:
+    # no fastmath and float32 arithmetic throughout, so the kernels produce exactly
+    # the same bytes as the numpy path below (fastmath may contract x * k + k into an FMA)
+    @njit(parallel=True, cache=True)
+    def _norm_u8_to_f32(img_flat, out):
+        scale = np.float32(1.0 / 127.5)
+        one = np.float32(1.0)
+        for i in prange(img_flat.size):
+            out[i] = np.float32(img_flat[i]) * scale - one
 
-def init_worker():
+    @njit(parallel=True, cache=True)
+    def _denorm_f32_to_u8(proc, out):
+        k = np.float32(127.5)
+        for i in prange(proc.size):
+            v = np.rint(proc[i] * k + k)
+            out[i] = min(np.float32(255.0), max(np.float32(0.0), v))
+
+def _warmup_kernels():
+    # pay the JIT compile cost once, before the first frame
+    img = np.zeros(3, dtype=np.uint8)
+    audio = np.empty(3, dtype=np.float32)
+    _norm_u8_to_f32(img, audio)
+    _denorm_f32_to_u8(audio, img)
+
+def init_worker(downscale=1):
+    """
+    Build the effect board. downscale is the factor the image is shrunk by on each axis before processing;
+    the delay is shortened by downscale**2 so echoes land the same distance away on screen.
+    """
     global _GLOBAL_BOARD
     if _GLOBAL_BOARD is None:
-        from pedalboard._pedalboard import Pedalboard
-        from pedalboard import Phaser, Delay, Reverb
         _GLOBAL_BOARD = Pedalboard([
-            Delay(delay_seconds=1, feedback=0.8, mix=1),
+            Delay(delay_seconds=1 / downscale**2, feedback=0.8, mix=1),
             #Reverb(room_size=0.8, damping=0.5, wet_level=0.8, dry_level=0.2, width=1.0, freeze_mode=0.0),
             #Phaser(rate_hz=0.005, feedback=0.1, mix=1),
             #Gain(0),
         ])
+    if njit is not None:
+        _warmup_kernels()
 
 def reduce(audio_data):
-    from noisereduce import reduce_noise
-    import numpy as _np
-    import tempfile
     reduction = reduce_noise(y=audio_data, 
                             sr=SAMPLE_RATE, 
                             freq_mask_smooth_hz=87,
@@ -34,31 +78,56 @@ def reduce(audio_data):
     return reduction
 
 def effect(audio_data, fs, frame_no, frame_count):
-    global _GLOBAL_BOARD
+    board = _GLOBAL_BOARD
     #audio_data = audio_data[::-1]
-    audio_data = _GLOBAL_BOARD(audio_data, fs)
+    audio_data = board(audio_data, fs, buffer_size=BUFFER_SIZE)
     #audio_data = reduce(audio_data)
     #audio_data = audio_data[::-1]
     return audio_data
 
-def process_image_array(image_array, frame_no, total_frames):
+def process_image_array(image_array, frame_no, total_frames, out=None):
     """
     Convert an image numpy array (H,W,3 uint8) to the 'audio' vector, run effect(), and return processed image array (H,W,3 uint8).
+    If out is given (e.g. a pygame.surfarray.pixels3d view), the result is written into it and out is returned.
+    Otherwise the result lives in a module-level buffer that is overwritten by the next call.
     """
-    # Flatten and normalize to -1..1 (float32)
-    audio_data = image_array.flatten().astype(np.float32, copy=False)
-    minv = float(audio_data.min())
-    maxv = float(audio_data.max())
-    if maxv == minv:
-        audio_data.fill(0.0)
-    else:
-        audio_data -= minv
-        audio_data /= (maxv - minv)
-        audio_data = 2.0 * audio_data - 1.0
+    # Both paths hand effect() a float32 buffer: pedalboard rejects anything other than
+    # 32-bit or 64-bit float audio, so int16/float16 input is not an option.
+    if njit is not None:
+        # fused single-pass kernels, no intermediate float arrays
+        img_flat = image_array.ravel()
+        audio_data = _scratch_buffer((img_flat.size,))
+        _norm_u8_to_f32(img_flat, audio_data)
+
+        processed = effect(audio_data, SAMPLE_RATE, frame_no, total_frames)
+
+        processed_bytes = _scratch_buffer((img_flat.size,), np.uint8)
+        _denorm_f32_to_u8(processed.reshape(-1), processed_bytes)
+        if out is None:
+            return processed_bytes.reshape(image_array.shape)
+        out[...] = processed_bytes.reshape(image_array.shape)
+        return out
+
+    # Flatten and map the full uint8 range 0..255 onto -1..1 (float32).
+    # A fixed scale keeps the effect consistent from frame to frame and
+    # needs no min/max reduction passes.
+    # Convert straight into a persistent contiguous workspace (one pass, even when image_array
+    # is a strided pixels3d view); reshape(-1) on it is a view.
+    work = _scratch_buffer(image_array.shape)
+    np.copyto(work, image_array, casting='unsafe')
+    audio_data = work.reshape(-1)
+    audio_data *= (1.0 / 127.5)
+    audio_data -= 1.0
 
     processed = effect(audio_data, SAMPLE_RATE, frame_no, total_frames)
 
-    # Denormalize back to uint8 image bytes
-    processed_bytes = ((processed + 1.0) * 0.5 * 255.0).clip(0, 255).astype(np.uint8)
-    processed_img = processed_bytes.reshape(image_array.shape)
-    return processed_img
\ No newline at end of file
+    # Denormalize back to uint8 image bytes: (x + 1) * 127.5 == x * 127.5 + 127.5.
+    # The input is no longer needed, so the same workspace holds the intermediate result.
+    np.multiply(processed.reshape(image_array.shape), 127.5, out=work)
+    np.add(work, 127.5, out=work)
+    np.rint(work, out=work)
+    np.clip(work, 0, 255, out=work)
+    if out is None:
+        out = _scratch_buffer(image_array.shape, np.uint8)
+    np.copyto(out, work, casting='unsafe')
+    return out
@@ -5,11 +5,16 @@ Usage:
 """
 
 import argparse
+import bisect
 import json
 import os
+import queue
 import sys
+import threading
 import time
 import math
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict
 
 import mido
@@ -24,6 +29,8 @@ def load_config(path: str):
     cfg.setdefault("window", {"width": 800, "height": 600, "bg_color": [0,0,0]})
     cfg.setdefault("scale_mode", "fit")
     cfg.setdefault("notes", {})
+    cfg.setdefault("use_alpha", False)
+    cfg.setdefault("scale_quality", "smooth")
     return cfg
 
 def choose_midi_port(port_arg: str = None):
@@ -44,7 +51,9 @@ def choose_midi_port(port_arg: str = None):
     print("Using MIDI input port:", ports[0])
     return ports[0]
 
-def load_images(image_folder: str, note_map: Dict[str, str]):
+def load_images(image_folder: str, note_map: Dict[str, str], use_alpha: bool = False):
+    # must be called after pygame.display.set_mode so images are converted to the display format.
+    # without alpha, blits are a straight copy instead of per-pixel blending.
     loaded = {}
     missing = []
     for note_str, fname in note_map.items():
@@ -53,7 +62,8 @@ def load_images(image_folder: str, note_map: Dict[str, str]):
             missing.append((note_str, path))
             continue
         try:
-            surf = pygame.image.load(path).convert_alpha()
+            surf = pygame.image.load(path)
+            surf = surf.convert_alpha() if use_alpha else surf.convert()
         except Exception as e:
             print(f"Failed to load image {path}: {e}", file=sys.stderr)
             missing.append((note_str, path))
@@ -65,8 +75,11 @@ def load_images(image_folder: str, note_map: Dict[str, str]):
             print("  note", n, "->", p, file=sys.stderr)
     return loaded
 
-def scale_surface_to_fit_exact(surf, max_w, max_h):
-    """Return a new Surface scaled to fit within (max_w, max_h) preserving aspect ratio."""
+def scale_surface_to_fit_exact(surf, max_w, max_h, smooth=True):
+    """
+    Return a new Surface scaled to fit within (max_w, max_h) preserving aspect ratio.
+    With smooth=False, exact integer downscales use the much cheaper pygame.transform.scale.
+    """
     w, h = surf.get_size()
     if w == 0 or h == 0:
         return surf
@@ -76,9 +89,12 @@ def scale_surface_to_fit_exact(surf, max_w, max_h):
     new_h = max(1, int(h * scale))
     if (new_w, new_h) == (w, h):
         return surf
+    if not smooth and w % new_w == 0 and h % new_h == 0 and w // new_w == h // new_h:
+        return pygame.transform.scale(surf, (new_w, new_h))
     return pygame.transform.smoothscale(surf, (new_w, new_h))
 
 
+@functools.lru_cache(maxsize=128)
 def compute_grid_dimensions(n_items, window_w, window_h, padding, min_cell_size):
     """
     Determine number of columns and rows for an n_items grid.
@@ -112,11 +128,34 @@ def compute_grid_dimensions(n_items, window_w, window_h, padding, min_cell_size)
 
     return cols, rows, cell_w, cell_h, left, top
 
-def process_screen(screen: pygame.Surface) -> pygame.Surface:
-    # convert screen to numpy array
-    arr = pygame.surfarray.array3d(screen)
-    processed = corruptize.process_image_array(arr, 0, 1)
-    return pygame.surfarray.make_surface(processed)
+def _midi_reader(inport, event_queue: queue.Queue):
+    """
+    Blocking loop forwarding MIDI messages from inport to event_queue.
+    Closing the port does not wake a blocked receive, so this never returns; run it as a daemon thread
+    and let it be abandoned at exit.
+    """
+    for msg in inport:
+        event_queue.put(msg)
+
+def process_screen(screen: pygame.Surface, effect_surf: pygame.Surface, overlay_surf: pygame.Surface) -> pygame.Surface:
+    """
+    Run the effect on screen at the resolution of effect_surf and return the result in overlay_surf.
+    If effect_surf is smaller than screen the result is scaled back up into overlay_surf, otherwise both are the same surface.
+    """
+    win_size = screen.get_size()
+    eff_size = effect_surf.get_size()
+    if eff_size != win_size:
+        src_surf = pygame.transform.smoothscale(screen, eff_size)
+    else:
+        src_surf = screen
+    # zero-copy views of the pixel buffers (these lock the surfaces until deleted)
+    src = pygame.surfarray.pixels3d(src_surf)
+    dst = pygame.surfarray.pixels3d(effect_surf)
+    corruptize.process_image_array(src, 0, 1, out=dst)
+    del src, dst
+    if eff_size != win_size:
+        pygame.transform.scale(effect_surf, win_size, overlay_surf)
+    return overlay_surf
 
 def main():
     parser = argparse.ArgumentParser(description="Realtime MIDI -> images (display while note held) in a grid")
@@ -135,24 +174,49 @@ def main():
     grid_padding = int(grid_cfg.get("padding", 8))        # space between cells and borders
     cell_margin = int(grid_cfg.get("cell_margin", 8))    # margin inside a cell between image and cell edge
     min_cell_size = int(grid_cfg.get("min_cell_size", 24))
+    smooth_scaling = cfg["scale_quality"] != "fast"   # "fast": nearest-neighbour for integer downscales
+
+    effects_cfg = cfg.get("effects", {})
+    downscale = max(1, int(effects_cfg.get("downscale", 2)))  # effect runs at 1/downscale resolution
 
     pygame.init()
     pygame.display.set_caption("MIDI → Images (grid: hold note to display)")
     screen = pygame.display.set_mode((win_w, win_h))
     clock = pygame.time.Clock()
+    # two sets of (effect, overlay) scratch surfaces (double-buffered):
+    # the worker fills one while the main loop blits the other
+    effect_size = (max(1, win_w // downscale), max(1, win_h // downscale))
+    effect_bufs = []
+    for _ in range(2):
+        effect_surf = pygame.Surface(effect_size)
+        overlay_surf = effect_surf if effect_size == (win_w, win_h) else pygame.Surface((win_w, win_h))
+        effect_bufs.append((effect_surf, overlay_surf))
+    effect_idx = 0
+    # effects run on a background thread; pedalboard releases the GIL while processing
+    executor = ThreadPoolExecutor(max_workers=1)
+    pending = None   # Future for the frame currently being processed
+    pending_stale = False   # pending was submitted before the notes were all released
+    overlay = None   # most recent finished effect overlay
 
     portname = choose_midi_port(args.port)
-    images = load_images(image_folder, notes_map)
+    images = load_images(image_folder, notes_map, bool(cfg["use_alpha"]))
 
     # active notes: note -> {"surf": Surface, "on_time": float}
     active = {}
+    # active note numbers kept in ascending order, updated only on note on/off
+    active_order = []
+    # scaled images: (id(surf), avail_w, avail_h) -> Surface
+    # cleared whenever the set of active notes changes, since that changes the cell size
+    scale_cache = {}
 
     try:
         with mido.open_input(portname) as inport:
             print("Listening for MIDI on:", portname)
+            # read MIDI on a background thread so note latency doesn't depend on the frame rate
+            event_queue = queue.Queue()
+            threading.Thread(target=_midi_reader, args=(inport, event_queue), daemon=True).start()
             running = True
-            corruptize.init_worker()
-            previous_frame = screen.copy()
+            corruptize.init_worker(downscale)
             while running:
                 # handle pygame events (close window, ESC)
                 for ev in pygame.event.get():
@@ -162,15 +226,21 @@ def main():
                         running = False
 
                 # process pending MIDI messages
-                for msg in inport.iter_pending():
+                while not event_queue.empty():
+                    msg = event_queue.get_nowait()
                     if msg.type == "note_on" and msg.velocity > 0:
                         note = int(msg.note)
                         if note in images:
+                            if note not in active:
+                                bisect.insort(active_order, note)
+                                scale_cache.clear()
                             active[note] = {"surf": images[note]["surf"], "on_time": time.time()}
                     elif msg.type == "note_off" or (msg.type == "note_on" and msg.velocity == 0):
                         note = int(msg.note)
                         if note in active:
                             del active[note]
+                            active_order.remove(note)
+                            scale_cache.clear()
 
                 # draw background
                 screen.fill(bg_color)
@@ -184,8 +254,7 @@ def main():
 
                     # Draw each active image into its grid cell
                     # order deterministically by note number so images don't jump around randomly
-                    sorted_notes = sorted(active.keys())
-                    for idx, note in enumerate(sorted_notes):
+                    for idx, note in enumerate(active_order):
                         row = idx // cols
                         col = idx % cols
                         cell_x = left + grid_padding + col * (cell_w + grid_padding)
@@ -197,7 +266,10 @@ def main():
 
                         surf = active[note]["surf"]
                         # scale to fit available area while preserving aspect ratio
-                        scaled = scale_surface_to_fit_exact(surf, avail_w, avail_h)
+                        key = (id(surf), avail_w, avail_h)
+                        scaled = scale_cache.get(key)
+                        if scaled is None:
+                            scaled = scale_cache[key] = scale_surface_to_fit_exact(surf, avail_w, avail_h, smooth_scaling)
 
                         sw, sh = scaled.get_size()
                         # center scaled image inside cell
@@ -207,10 +279,25 @@ def main():
                         screen.blit(scaled, (pos_x, pos_y))
 
                 # effects processing
-                # takes the screen, runs effects, returns modified screen
-                modified = process_screen(screen)
-                modified.set_alpha(128)  # half opacity
-                screen.blit(modified, (0,0), special_flags=pygame.BLEND_ADD)
+                # takes a copy of the screen, runs effects in the background, returns modified screen.
+                # the overlay shown is the latest finished one, so drawing never waits on the DSP.
+                # with no notes held the screen is plain bg_color (and the board is reset on every
+                # call, so no delay tail carries over between frames): skip the effect and overlay.
+                if pending is not None and pending.done():
+                    result = pending.result()
+                    if not pending_stale:
+                        overlay = result
+                    pending = None
+                if n_active == 0:
+                    overlay = None
+                    # a job still in flight shows notes that are released now; drop its result
+                    pending_stale = True
+                elif pending is None:
+                    pending = executor.submit(process_screen, screen.copy(), *effect_bufs[effect_idx])
+                    pending_stale = False
+                    effect_idx ^= 1
+                if overlay is not None:
+                    screen.blit(overlay, (0,0), special_flags=pygame.BLEND_ADD)
 
                 # flip display
                 pygame.display.flip()
@@ -219,6 +306,7 @@ def main():
     except KeyboardInterrupt:
         print("Interrupted by user, exiting.")
     finally:
+        executor.shutdown(wait=True)
         pygame.quit()
         print("Goodbye.")
 